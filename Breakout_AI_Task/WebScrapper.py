@@ -1,62 +1,144 @@
 import os
-import re
 from dotenv import load_dotenv
 import aiohttp
+import aiofiles
+from aiolimiter import AsyncLimiter
 import asyncio
-from bs4 import BeautifulSoup
 import time
-from urllib.parse import quote
-from random import uniform
+from collections import defaultdict
+from contextlib import asynccontextmanager, nullcontext
+from urllib.parse import quote, urlparse
 import logging
-from typing import List, Dict
-import lxml
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from lxml import etree
+
+# Prefer RE2 (linear-time matching) for the cleaning pattern when installed
+try:
+    import re2 as re
+except ImportError:
+    import re
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 
-# Cache for preprocessed text
-TEXT_CACHE = {}
+# Default request headers, set once on the shared session
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# Precompiled pattern for preprocess_text: any run of tags, URLs,
+# non-alphabetic characters and whitespace collapses to a single space
+_CLEAN_RE = re.compile(r'(?:<[^>]+>|http\S+|[^a-zA-Z\s]|\s)+')
+
+# Google's own hosts (google.com, www.google.co.uk, webcache.googleusercontent.com, ...)
+_GOOGLE_HOST_RE = re.compile(r'(?:^|\.)(?:google(?:\.[a-z]{2,3}){1,2}|googleusercontent\.com)$')
+
+# Elements dropped during extraction and elements whose text is collected
+_UNWANTED_TAGS = frozenset({'script', 'style', 'header', 'footer', 'nav'})
+_TEXT_TAGS = frozenset({'p', 'article', 'section', 'div'})
+
+# Streaming parse limits for extract_text_from_url
+_CHUNK_SIZE = 16384
+_MAX_TEXT_CHARS = 200_000
+_MAX_PAGE_BYTES = 512_000
+_PAGE_TIMEOUT = aiohttp.ClientTimeout(total=5)
 
 def preprocess_text(text: str) -> str:
-    """Preprocesses text with caching"""
-    cache_key = hash(text)
-    if cache_key in TEXT_CACHE:
-        return TEXT_CACHE[cache_key]
-    
+    """Preprocesses text in a single regex pass"""
     # Combine all regex operations into one pass
-    text = re.sub(
-        r'(<[^>]+>)|(http\S+)|[^a-zA-Z\s]',
-        ' ',
-        text.lower()
-    ).strip()
-    text = ' '.join(text.split())
-    
-    TEXT_CACHE[cache_key] = text
-    return text
+    return _CLEAN_RE.sub(' ', text.lower()).strip()
+
+def create_search_limiter(max_rate: float = 5, time_period: float = 1.0) -> AsyncLimiter:
+    """Creates a non-blocking rate limit for search requests, which all hit one host
+
+    aiolimiter is bound to one event loop and is not thread-safe, so each
+    run creates its own limiter instead of sharing a module-level one.
+    """
+    return AsyncLimiter(max_rate, time_period)
+
+def create_session(limit: int = 32, keepalive_timeout: int = 30) -> aiohttp.ClientSession:
+    """Creates a ClientSession with a pooled keep-alive connector"""
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=8,
+        ttl_dns_cache=300,
+        keepalive_timeout=keepalive_timeout
+    )
+    return aiohttp.ClientSession(connector=connector, headers=HEADERS)
+
+def _collect_text(parser: etree.HTMLPullParser, parts: List[str]) -> int:
+    """Appends text of finished content elements and returns chars added"""
+    added = 0
+    for _, element in parser.read_events():
+        tag = element.tag
+        if tag in _TEXT_TAGS and not any(
+            ancestor.tag in _UNWANTED_TAGS for ancestor in element.iterancestors()
+        ):
+            text = etree.tostring(
+                element, method='text', encoding='unicode', with_tail=False
+            )
+            parts.append(text)
+            added += len(text)
+        # Clearing keeps the tail text, which belongs to the parent
+        if tag in _TEXT_TAGS or tag in _UNWANTED_TAGS:
+            element.clear(keep_tail=True)
+    return added
+
+class HostThrottle:
+    """Per-host politeness: caps requests in flight and spaces out their starts"""
+
+    def __init__(self, max_inflight: int = 2, delay_ms: int = 100):
+        self.delay = delay_ms / 1000
+        self._semaphores = defaultdict(lambda: asyncio.Semaphore(max_inflight))
+        self._next_start = defaultdict(float)
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        """Waits for a free slot on the URL's host, then holds it"""
+        host = urlparse(url).netloc
+        async with self._semaphores[host]:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            start = max(now, self._next_start[host])
+            self._next_start[host] = start + self.delay
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
 
-async def extract_text_from_url(url: str, session: aiohttp.ClientSession) -> str:
+async def extract_text_from_url(url: str, session: aiohttp.ClientSession, throttle: Optional[HostThrottle] = None) -> str:
     """Asynchronously extracts text from URL"""
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        async with session.get(url, headers=headers, timeout=5) as response:
+        async with throttle.slot(url) if throttle else nullcontext(), \
+                session.get(url, timeout=_PAGE_TIMEOUT) as response:
             if response.status != 200:
                 return ""
+            
+            # Skip non-HTML bodies (PDFs, media, ...) and oversized pages
+            # before reading any of the body
+            if 'html' not in response.headers.get('Content-Type', ''):
+                return ""
+            if (response.content_length or 0) > _MAX_PAGE_BYTES:
+                return ""
                 
-            html = await response.text()
-            soup = BeautifulSoup(html, 'lxml')
+            # Parse while downloading so only the unprocessed part of the
+            # page stays live, and stop once enough text has been collected
+            # or the byte cap is reached
+            parser = etree.HTMLPullParser(events=('end',))
+            parts = []
+            collected = 0
+            received = 0
 
-            # Remove unwanted elements in one pass
-            for element in soup(['script', 'style', 'header', 'footer', 'nav']):
-                element.decompose()
+            async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+                parser.feed(chunk)
+                received += len(chunk)
+                collected += _collect_text(parser, parts)
+                if collected >= _MAX_TEXT_CHARS or received >= _MAX_PAGE_BYTES:
+                    break
+            else:
+                parser.close()
+                _collect_text(parser, parts)
 
-            # Extract text more efficiently
-            text_content = ' '.join(
-                element.get_text()
-                for element in soup.find_all(['p', 'article', 'section', 'div'])
-            )
+            text_content = ' '.join(parts)[:_MAX_TEXT_CHARS]
             
             return preprocess_text(text_content)
             
@@ -64,59 +146,76 @@ async def extract_text_from_url(url: str, session: aiohttp.ClientSession) -> str
         logging.error(f"Error extracting text from {url}: {str(e)}")
         return ""
 
-async def extract_top_website_text(keyword: str, top_n: int, session: aiohttp.ClientSession) -> List[Dict[str, str]]:
+def _result_urls(parser: etree.HTMLPullParser) -> List[str]:
+    """Returns external result links (anchors inside div.g) parsed so far"""
+    urls = []
+    for _, link in parser.read_events():
+        href = link.get('href', '')
+        # Skip Google's own links (cache, translate, ...) without fetching
+        if not href.startswith('http') or _GOOGLE_HOST_RE.search(urlparse(href).hostname or ''):
+            continue
+        if any(
+            ancestor.tag == 'div' and 'g' in ancestor.get('class', '').split()
+            for ancestor in link.iterancestors()
+        ):
+            urls.append(href)
+    return urls
+
+async def _fetch_result(url: str, session: aiohttp.ClientSession, throttle: Optional[HostThrottle]) -> Tuple[str, str]:
+    """Fetches a result page, returning its URL alongside the text"""
+    return url, await extract_text_from_url(url, session, throttle)
+
+async def extract_top_website_text(keyword: str, top_n: int, session: aiohttp.ClientSession, throttle: Optional[HostThrottle] = None, out_dir: str = 'data', search_limit: Optional[AsyncLimiter] = None) -> List[Dict[str, str]]:
     """Asynchronously extracts text from top search results"""
+    tasks = []
     try:
         encoded_keyword = quote(keyword)
         search_url = f"https://www.google.com/search?q={encoded_keyword}&num={top_n+5}"
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        async with session.get(search_url, headers=headers) as response:
+        async with search_limit or nullcontext(), session.get(search_url) as response:
             if response.status != 200:
                 return []
                 
-            html = await response.text()
-            soup = BeautifulSoup(html, 'lxml')
+            # Start fetching each result page as soon as its link is parsed
+            # instead of waiting for the whole results page to download
+            parser = etree.HTMLPullParser(events=('start',), tag='a')
             
-            # Extract URLs more efficiently
-            urls = [
-                link['href']
-                for link in soup.select('div.g a')
-                if link.get('href', '').startswith('http')
-            ][:top_n]
-            
-            # Process URLs concurrently
-            tasks = [
-                extract_text_from_url(url, session)
-                for url in urls
-            ]
-            contents = await asyncio.gather(*tasks)
-            
-            # Create results and filter empty contents
-            website_contents = [
-                {'url': url, 'content': content}
-                for url, content in zip(urls, contents)
-                if content
-            ]
-            
-            await save_to_markdown(website_contents, keyword)
-            return website_contents
+            async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+                parser.feed(chunk)
+                for url in _result_urls(parser):
+                    if len(tasks) < top_n:
+                        tasks.append(asyncio.create_task(_fetch_result(url, session, throttle)))
+                if len(tasks) >= top_n:
+                    break
+        
+        # Collect results in completion order and filter empty contents
+        website_contents = []
+        for next_result in asyncio.as_completed(tasks):
+            url, content = await next_result
+            if content:
+                website_contents.append({'url': url, 'content': content})
+        
+        await save_to_markdown(website_contents, keyword, out_dir)
+        return website_contents
             
     except Exception as e:
         logging.error(f"Error during search: {str(e)}")
         return []
+    
+    finally:
+        # Don't leave page fetches running for an abandoned search
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
-async def save_to_markdown(data: List[Dict[str, str]], keyword: str) -> str:
-    """Asynchronously saves data to markdown"""
-    if not os.path.exists('data'):
-        os.makedirs('data')
+async def save_to_markdown(data: List[Dict[str, str]], keyword: str, out_dir: str = 'data') -> str:
+    """Asynchronously saves data to markdown in out_dir"""
+    os.makedirs(out_dir, exist_ok=True)
     
-    filename = f"data/{keyword}.md"
+    filename = os.path.join(out_dir, f"{keyword}.md")
     
-    # Build content string efficiently
+    # Collect content parts; they are written out without joining them
+    # into one document-sized string first
     content_parts = [
         f"# Search Results for: {keyword}\n",
         f"Date: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
@@ -130,22 +229,21 @@ async def save_to_markdown(data: List[Dict[str, str]], keyword: str) -> str:
             "---\n\n"
         ])
     
-    markdown_content = ''.join(content_parts)
-    
     # Use async file operations
-    async with aiohttp.ClientSession() as session:
-        async with aiohttp.StreamWriter(filename, 'w', encoding='utf-8') as file:
-            await file.write(markdown_content)
+    async with aiofiles.open(filename, 'w', encoding='utf-8') as file:
+        await file.writelines(content_parts)
     
     logging.info(f"Data saved successfully to {filename}")
     return filename
 
 # Example usage
 async def main():
-    async with aiohttp.ClientSession() as session:
+    async with create_session() as session:
         keyword = "artificial intelligence"
         num_results = 3
-        results = await extract_top_website_text(keyword, num_results, session)
+        results = await extract_top_website_text(
+            keyword, num_results, session, search_limit=create_search_limiter()
+        )
         print(f"Processed {len(results)} results")
 
 if __name__ == "__main__":
@@ -1,24 +1,38 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
 import io
+import shutil
+from urllib.request import urlopen
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, Iterator
 import logging
+import orjson
 from main import AllInOne
 import nltk
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Download required NLTK data
-try:
-    nltk.download("punkt")
-    nltk.download("averaged_perceptron_tagger")
-    nltk.download("stopwords")
-except Exception as e:
-    logging.error(f"Error downloading NLTK data: {str(e)}")
+# NLTK data required by the keyword extractor, by package and resource path
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+    'averaged_perceptron_tagger_eng': 'taggers/averaged_perceptron_tagger_eng',
+    'stopwords': 'corpora/stopwords',
+}
+
+# Download required NLTK data only if it is not already installed
+for package, resource in NLTK_RESOURCES.items():
+    try:
+        nltk.data.find(resource)
+    except LookupError:
+        try:
+            nltk.download(package, quiet=True)
+        except Exception as e:
+            logging.error(f"Error downloading NLTK data: {str(e)}")
 
 app = Flask(__name__)
 
@@ -40,6 +54,7 @@ CORS(app, resources={
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'csv'}
+CSV_CHUNK_ROWS = 1000
 
 # Ensure required directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -48,6 +63,16 @@ def allowed_file(filename: str) -> bool:
     """Check if the uploaded file has an allowed extension"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def generate_csv_json(df: pd.DataFrame) -> Iterator[bytes]:
+    """Yield {"success": true, "data": <csv>} as JSON, CSV_CHUNK_ROWS rows at a time"""
+    yield b'{"success": true, "data": "'
+    # An empty frame still yields one (header-only) chunk
+    for start in range(0, max(len(df), 1), CSV_CHUNK_ROWS):
+        chunk = df.iloc[start:start + CSV_CHUNK_ROWS].to_csv(index=False, header=start == 0)
+        # Escaped string contents without the surrounding quotes
+        yield orjson.dumps(chunk)[1:-1]
+    yield b'"}'
+
 @app.route('/health', methods=['GET'])
 def health_check() -> Dict[str, str]:
     """Health check endpoint"""
@@ -62,11 +87,8 @@ def get_sheets_headers() -> Any:
     # Convert the Google Sheet URL to CSV export URL
     csv_url = f'https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv'
     try:
-        df = pd.read_csv(csv_url)
-        
-        headers = df.columns.tolist()
-        print(df)
-        print(headers)
+        # Only the header row is needed; skip parsing the data rows
+        headers = pd.read_csv(csv_url, nrows=0).columns.tolist()
         response = jsonify({'headers': headers})
         response.headers['Access-Control-Allow-Origin'] = request.headers.get('Origin', '*')
         response.headers['Access-Control-Allow-Credentials'] = 'true'
@@ -112,11 +134,11 @@ def process_data() -> Any:
             sheet_id = sheet_url.split('/')[5]
             csv_url = f'https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv'
             
-            # Download and save the CSV
-            df = pd.read_csv(csv_url)
+            # Download the CSV straight to disk without a parse/re-serialize round trip
             filename = 'sheet_data.csv'
             filepath = os.path.join(UPLOAD_FOLDER, filename)
-            df.to_csv(filepath, index=False)
+            with urlopen(csv_url) as source, open(filepath, 'wb') as target:
+                shutil.copyfileobj(source, target)
             
         else:
             return jsonify({'error': 'No file or sheet URL provided'}), 400
@@ -144,19 +166,17 @@ def process_data() -> Any:
         # Execute processing
         processor()
         
-        # Convert results to CSV in-memory
-        output_df = processor.get_results_as_dataframe()  # Assumes processor has a method to return a DataFrame
-        # output_df = pd.DataFrame({'Company Name': ['Company A', 'Company B'], 'Result': ['Result A', 'Result B']})
-        # output_buffer = io.StringIO()
-        csv_string = output_df.to_csv(index=False) 
-        print(csv_string)
-        # output_df.to_csv(output_buffer, index=False)
-        # output_buffer.seek(0)
+        output_df = processor.get_results_as_dataframe()
         
         # Clean up uploaded file
         os.remove(filepath)
         
-        response = jsonify({'success':True,"data" : csv_string})
+        # Stream the CSV inside the JSON body chunk by chunk rather than
+        # building the whole CSV string and response in memory
+        response = Response(
+            generate_csv_json(output_df),
+            mimetype='application/json'
+        )
         
         # Add CORS headers to the response
         response.headers['Access-Control-Allow-Origin'] = request.headers.get('Origin', '*')
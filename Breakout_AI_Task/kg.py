@@ -2,13 +2,98 @@ from llama_index.llms.groq import Groq
 from dotenv import load_dotenv
 import os
 from py2neo import Graph
-from llama_index.core import KnowledgeGraphIndex, SimpleDirectoryReader
-from llama_index.core import StorageContext
+from llama_index.core import KnowledgeGraphIndex, SimpleDirectoryReader, Document
+from llama_index.core import StorageContext, QueryBundle
 from llama_index.graph_stores.neo4j import Neo4jGraphStore
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.core import Settings
 from IPython.display import Markdown, display
-import pickle
+import asyncio
+import mmap
+import shutil
+import tempfile
+import logging
+
+# Quantized ONNX embeddings are used when optimum/onnxruntime are installed
+try:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+    from llama_index.embeddings.huggingface_optimum import OptimumEmbedding
+except ImportError:
+    OptimumEmbedding = None
+
+EMBED_MODEL = "BAAI/bge-small-en-v1.5"
+EMBED_CACHE = "embedding_cache"
+
+# Triplet extraction costs one LLM call per chunk, so each chunk yields a
+# single triplet, no embeddings are computed (the keyword retriever used by
+# KG.query does not need them) and no progress bar is drawn
+INDEX_SETTINGS = dict(
+    max_triplets_per_chunk=1,
+    show_progress=False,
+    include_embeddings=False,
+)
+
+def load_embed_model():
+    """Load the BGE embedding model, preferring an int8-quantized ONNX export.
+
+    The ONNX model is exported and dynamically quantized once, then reused
+    from the embedding cache folder. The export is written to a scratch
+    folder and moved into place only once complete, so an interrupted
+    export is redone instead of being loaded half-written.
+
+    Returns:
+        BaseEmbedding: Embedding model for Settings.embed_model.
+    """
+    if OptimumEmbedding is None:
+        return HuggingFaceEmbedding(model_name=EMBED_MODEL, cache_folder=EMBED_CACHE)
+
+    onnx_path = os.path.join(EMBED_CACHE, "bge-small-en-v1.5-onnx-int8")
+    if not os.path.exists(onnx_path):
+        os.makedirs(EMBED_CACHE, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix=".onnx-export-", dir=EMBED_CACHE)
+        try:
+            model = ORTModelForFeatureExtraction.from_pretrained(
+                EMBED_MODEL, export=True, cache_dir=EMBED_CACHE
+            )
+            quantizer = ORTQuantizer.from_pretrained(model)
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=tmp_path, quantization_config=qconfig)
+            AutoTokenizer.from_pretrained(EMBED_MODEL, cache_dir=EMBED_CACHE).save_pretrained(tmp_path)
+            try:
+                os.replace(tmp_path, onnx_path)
+            except OSError:
+                # Another process finished the same export first
+                if not os.path.isdir(onnx_path):
+                    raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return OptimumEmbedding(folder_name=onnx_path)
+
+def load_document(path):
+    """Load a text file as a Document, decoding straight from a memory map.
+
+    The file is mapped rather than read, and decoded from the mapping without
+    an intermediate bytes copy.
+
+    Args:
+        path (str): Path of the text file.
+
+    Returns:
+        Document: Document holding the file text.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            text = ""
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    text = str(view, 'utf-8', 'ignore')
+    return Document(
+        text=text,
+        metadata={'file_path': path, 'file_name': os.path.basename(path)}
+    )
 
 class KG:
     def __init__(self, Web_path):
@@ -23,14 +108,10 @@ class KG:
             api_key=os.getenv("Groq_key"),
             temperature=0.1
         )
-        embed_model = HuggingFaceEmbedding(
-            model_name="BAAI/bge-small-en-v1.5",
-            cache_folder="embedding_cache"
-        )
         Settings.llm = llm
-        Settings.embed_model = embed_model
+        Settings.embed_model = load_embed_model()
         Settings.chunk_size = 2048
-        Settings.embed_batch_size = 32
+        Settings.embed_batch_size = 128
         
         self.graph_store = Neo4jGraphStore(
             username=os.getenv("NEO4J_USER"),
@@ -40,40 +121,91 @@ class KG:
         )
         self.storage_context = StorageContext.from_defaults(graph_store=self.graph_store)
         
-        # Add caching for documents
-        self.cache_file = os.path.join(Web_path, "kg_cache.pkl")
+        os.makedirs(Web_path, exist_ok=True)
         
         self.index = self.build_knowledge_graph()
+        self.warm_up()
 
-    def build_knowledge_graph(self):
-        """Build Knowledge Graph from documents.
+    def warm_up(self):
+        """Open the LLM connection ahead of the first query.
+
+        It is otherwise initialized lazily inside the first search, stalling
+        every search waiting behind it. The embedding model needs no warm-up,
+        since neither indexing nor the keyword retriever embeds anything.
+        Failures are logged and left to surface on real use.
+        """
+        try:
+            Settings.llm.complete("ping")
+        except Exception as e:
+            logging.warning(f"KG warm-up failed: {str(e)}")
+
+    def _document_files(self):
+        """List the (non-hidden) document files directly inside the folder.
+
+        Returns:
+            list: os.DirEntry objects sorted by name.
+        """
+        return sorted(
+            (entry for entry in os.scandir(self.path)
+             if entry.is_file() and not entry.name.startswith('.')),
+            key=lambda e: e.name
+        )
+
+    def _index_from_documents(self, documents):
+        """Create the index with the extraction settings used for every build.
+
+        Args:
+            documents (list): Documents to extract triplets from.
 
         Returns:
             KnowledgeGraphIndex: Knowledge Graph Index built from the documents.
         """
-        # Try to load from cache first
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'rb') as f:
-                    return pickle.load(f)
-            except:
-                pass
-                
-        documents = SimpleDirectoryReader(self.path).load_data()
-        index = KnowledgeGraphIndex.from_documents(
+        return KnowledgeGraphIndex.from_documents(
             documents,
             storage_context=self.storage_context,
-            max_triplets_per_chunk=8,
-            show_progress=True,
-            include_embeddings=True,
+            **INDEX_SETTINGS,
         )
-        
-        # Cache the index
-        with open(self.cache_file, 'wb') as f:
-            pickle.dump(index, f)
+
+    def build_knowledge_graph(self):
+        """Build Knowledge Graph from documents.
+
+        Returns:
+            KnowledgeGraphIndex: Knowledge Graph Index built from the documents.
+        """
+        # Start from an empty graph when there is nothing to read yet;
+        # documents are then added per search with add_documents
+        files = [entry.path for entry in self._document_files()]
+        documents = []
+        if files:
+            # Parse the files in parallel; the list is already known, so the
+            # reader doesn't need to walk the folder again
+            documents = SimpleDirectoryReader(input_files=files).load_data(
+                num_workers=min(8, os.cpu_count() or 1, len(files))
+            )
+        index = self._index_from_documents(documents)
             
         return index
 
+    def add_documents(self, path):
+        """Insert documents into the existing index without rebuilding it.
+
+        Args:
+            path (str): Folder of documents, or a single document file.
+        """
+        if os.path.isfile(path):
+            files = [path]
+        else:
+            files = [
+                entry.path for entry in os.scandir(path)
+                if entry.is_file() and not entry.name.startswith('.')
+            ]
+        if not files:
+            return
+        # Per-search folders hold a handful of files and this runs on worker
+        # threads, so files are read serially rather than via a process pool
+        for file in files:
+            self.index.insert(load_document(file))
+
     def query(self, question):
         """Query the knowledge graph and return response text.
 
@@ -90,4 +222,29 @@ class KG:
         )
         response = query_engine.query(question)
         # Convert streaming response to string for serialization
-        return str(response)
\ No newline at end of file
+        return str(response)
+
+    async def aquery(self, question, executor=None):
+        """Asynchronously query the knowledge graph and return response text.
+
+        The keyword retriever has no async path and would run its LLM and
+        Neo4j calls on the event loop, so retrieval runs on the executor;
+        the answer is then synthesized with the LLM's async API.
+
+        Args:
+            question (str): Question to be asked.
+            executor (Executor, optional): Executor for retrieval. Defaults to the loop's default.
+
+        Returns:
+            str: Response text
+        """
+        query_engine = self.index.as_query_engine(
+            include_text=True,
+            response_mode="tree_summarize"
+        )
+        query_bundle = QueryBundle(question)
+        nodes = await asyncio.get_running_loop().run_in_executor(
+            executor, query_engine.retrieve, query_bundle
+        )
+        response = await query_engine.asynthesize(query_bundle, nodes)
+        return str(response)
@@ -1,20 +1,47 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
+import shutil
 import pandas as pd
-from typing import List, Dict, Optional
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from typing import Any, List, Dict, Optional, Tuple
 from tqdm import tqdm
 import logging
+import json
+import atexit
 import pickle
-import hashlib
-from functools import lru_cache, partial
+import sqlite3
+import threading
+from hashlib import blake2b
+from functools import partial
 import asyncio
 import aiohttp
 import multiprocessing
 
 from Keyword_extractor import extract_keywords
-from WebScrapper import extract_top_website_text
+from aiolimiter import AsyncLimiter
+from WebScrapper import extract_top_website_text, create_session, create_search_limiter, HostThrottle
 from kg import KG
 
+# Cached responses are LZ4-compressed when lz4 is installed
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+LZ4_FRAME_MAGIC = b'\x04\x22\x4d\x18'
+
+# Append-only JSONL checkpoint of (search, answer) pairs
+INTERMEDIATE_FILE = "intermediate_results.jsonl"
+
+# Options for every read of the input CSV. The searched column and the
+# full frame must parse to the same rows, and the C engine (unlike
+# pyarrow) pads short rows with NaN as uploads expect. low_memory=False
+# infers each column's type from the whole file rather than per chunk,
+# so large files don't yield columns mixing int and str
+CSV_READ_OPTIONS = dict(engine="c", low_memory=False)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,6 +49,150 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
+def get_cache_key(search: str) -> str:
+    """
+    Generate a stable cache key from search string.
+
+    The key only needs to be stable, not cryptographic, so BLAKE2b with a
+    short digest is used.
+
+    Args:
+        search (str): Search query string
+
+    Returns:
+        str: Cache key
+    """
+    return blake2b(search.encode(), digest_size=8).hexdigest()
+
+class SearchCache:
+    """
+    SQLite-backed key-value store for search responses.
+
+    All entries live in one database file, so lookups and writes are single
+    indexed statements instead of one pickle file per search. Connections
+    are kept per thread because sqlite3 connections cannot be shared.
+    Responses are pickled and, when lz4 is installed, LZ4-frame compressed;
+    compressed blobs are recognised by the frame magic number on read.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open (and create if needed) the cache database.
+
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        self.path = path
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, response BLOB NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a cached response.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            Any: Cached response, or None if there is no entry
+        """
+        row = self._connect().execute("SELECT response FROM kv WHERE k = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        blob = row[0]
+        if blob[:4] == LZ4_FRAME_MAGIC:
+            blob = lz4.frame.decompress(blob)
+        return pickle.loads(blob)
+
+    def set(self, key: str, response: Any) -> None:
+        """
+        Store a response, replacing any existing entry.
+
+        Args:
+            key (str): Cache key
+            response (Any): Response to cache
+        """
+        blob = pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL)
+        if lz4 is not None:
+            blob = lz4.frame.compress(blob)
+        self._connect().execute(
+            "INSERT OR REPLACE INTO kv (k, response) VALUES (?, ?)",
+            (key, blob)
+        )
+
+class CheckpointLog:
+    """
+    Append-only log that batches records into vectored writes.
+
+    Records are buffered and written with a single os.writev call once
+    batch_size of them are pending (or on flush), instead of one write
+    syscall per record. Pending records are flushed at interpreter exit.
+    """
+
+    def __init__(self, path: str, batch_size: int = 1000):
+        """
+        Create (or truncate) the log file.
+
+        Args:
+            path (str): Path of the log file
+            batch_size (int, optional): Records buffered per write. Defaults to 1000.
+        """
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        # writev accepts at most IOV_MAX buffers per call
+        iov_max = os.sysconf('SC_IOV_MAX') if hasattr(os, 'sysconf') else 1024
+        self.batch_size = max(1, min(batch_size, iov_max))
+        self._buffers: List[bytes] = []
+        atexit.register(self.close)
+
+    def write(self, record: bytes) -> None:
+        """Buffer one record, flushing when the batch is full."""
+        self._buffers.append(record)
+        if len(self._buffers) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all buffered records, retrying after partial writes."""
+        buffers = self._buffers
+        self._buffers = []
+        while buffers:
+            if hasattr(os, 'writev'):
+                written = os.writev(self.fd, buffers)
+            else:
+                written = os.write(self.fd, b''.join(buffers))
+            # Drop fully written buffers and trim a partially written one
+            while buffers and written >= len(buffers[0]):
+                written -= len(buffers[0])
+                buffers.pop(0)
+            if buffers and written:
+                buffers[0] = buffers[0][written:]
+
+    def close(self) -> None:
+        """Flush pending records and close the file."""
+        if self.fd is None:
+            return
+        self.flush()
+        os.close(self.fd)
+        self.fd = None
+        atexit.unregister(self.close)
+
+    def __enter__(self) -> "CheckpointLog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
 class AllInOne:
     """
     A class that processes search queries in parallel, extracts information, and manages results.
@@ -41,7 +212,10 @@ class AllInOne:
         question: str, 
         max_workers: Optional[int] = None,
         cache_dir: str = "cache",
-        batch_size: int = 100
+        batch_size: int = 100,
+        max_concurrency: int = 100,
+        max_per_host_inflight: int = 2,
+        per_host_delay_ms: int = 100
     ):
         """
         Initialize the AllInOne processor.
@@ -52,104 +226,173 @@ class AllInOne:
             question (str): Question to be answered
             max_workers (int, optional): Maximum number of parallel workers. Defaults to 3.
             cache_dir (str, optional): Directory for caching results. Defaults to "cache".
-            batch_size (int, optional): Size of batches for batch processing. Defaults to 100.
+            batch_size (int, optional): Results written per checkpoint flush. Defaults to 100.
+            max_concurrency (int, optional): Maximum number of searches in flight. Defaults to 100.
+            max_per_host_inflight (int, optional): Maximum page fetches in flight per host. Defaults to 2.
+            per_host_delay_ms (int, optional): Minimum delay between fetch starts on one host. Defaults to 100.
         """
-        self.csv = pd.read_csv(csv_path)
-        self.column = list(self.csv[column])
+        # Only the searched column is needed to run; the remaining columns
+        # are read back once, when results are first requested
+        self.csv_path = csv_path
+        self._results: Optional[pd.DataFrame] = None
+        self.csv = pd.read_csv(
+            csv_path,
+            usecols=[column],
+            dtype={column: "string[pyarrow]"},
+            **CSV_READ_OPTIONS
+        )
         self.question = question
         self.max_workers = max_workers or min(32, multiprocessing.cpu_count() * 2)
         self.cache_dir = cache_dir
         self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_per_host_inflight = max_per_host_inflight
+        self.per_host_delay_ms = per_host_delay_ms
         
         # Pre-compute and cache everything possible
         self._setup_cache()
         self.suffix = ' '.join(extract_keywords(self.question))
-        self.searches = [f"{text} {self.suffix}" for text in self.column]
+        # Deduplicate so repeated names are scraped and queried once;
+        # self.search_index maps each row to its entry in self.names and
+        # self.searches. Missing and blank names become empty strings,
+        # which are answered with an empty string without searching
+        self.search_index, unique_names = pd.factorize(self.csv[column].fillna('').str.strip())
+        self.names = unique_names.tolist()
+        # Vectorized concat
+        self.searches = (unique_names + f" {self.suffix}").tolist()
+        # Cache keys aligned with self.searches, computed once up front
+        self.cache_keys = [get_cache_key(search) for search in self.searches]
         
-        # Initialize shared KG instance
+        # Initialize shared KG instance; its blocking queries run on a
+        # thread pool so they don't stall the event loop
         self.knowledge_g = KG('data')
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
 
     def _setup_cache(self) -> None:
-        """Create cache directory if it doesn't exist."""
+        """Create cache directory if it doesn't exist and open the cache database."""
         os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache = SearchCache(os.path.join(self.cache_dir, "cache.db"))
+
+    def _ingest_dir(self, out_dir: str) -> None:
+        """
+        Add a search's scraped files to the shared knowledge graph.
 
-    @lru_cache(maxsize=1000)  # Add memory-based caching
-    def _get_cache_filename(self, search: str) -> str:
+        Args:
+            out_dir (str): Folder the scraper wrote this search's files to
         """
-        Generate a stable cache filename from search string.
+        try:
+            self.knowledge_g.add_documents(out_dir)
+        except FileNotFoundError:
+            # The scrape failed before writing anything
+            pass
+
+    def _question_for(self, idx: int) -> str:
+        """
+        Phrase the question about self.names[idx].
+
+        The shared graph holds every search ingested so far, so the question
+        names the entity it is asked about.
 
         Args:
-            search (str): Search query string
+            idx (int): Index into self.names
 
         Returns:
-            str: Cache filename
+            str: Question for this search
         """
-        hash_object = hashlib.md5(search.encode())
-        return os.path.join(self.cache_dir, f"search_{hash_object.hexdigest()[:10]}.pkl")
+        return f"Regarding {self.names[idx]}: {self.question}"
 
-    async def _fetch_website_text(self, search: str, session: aiohttp.ClientSession) -> str:
+    async def _fetch_website_text(self, search: str, session: aiohttp.ClientSession, throttle: HostThrottle, search_limit: AsyncLimiter, out_dir: str) -> str:
         """Asynchronous version of website text extraction"""
         try:
-            return await extract_top_website_text(search, 3, session)
+            return await extract_top_website_text(search, 3, session, throttle, out_dir, search_limit)
         except Exception as e:
             logging.error(f"Error fetching text for {search}: {str(e)}")
             return ""
 
-    async def _process_single_search_async(self, search: str, session: aiohttp.ClientSession) -> str:
-        """Asynchronous version of single search processing"""
-        cache_file = self._get_cache_filename(search)
+    async def _process_single_search_async(self, idx: int, session: aiohttp.ClientSession, throttle: HostThrottle, search_limit: AsyncLimiter) -> str:
+        """Asynchronous version of single search processing for self.searches[idx]"""
+        # Blank names have nothing to search for
+        if not self.names[idx]:
+            return ""
+        
+        search = self.searches[idx]
+        cache_key = self.cache_keys[idx]
+        
+        try:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        except Exception:
+            pass
         
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, 'rb') as f:
-                    return pickle.load(f)
-            except Exception:
-                pass
+        # Each search scrapes into its own folder so concurrent searches
+        # never read or delete each other's files
+        out_dir = os.path.join("data", cache_key)
         
         try:
-            await self._fetch_website_text(search, session)
-            response = self.knowledge_g.query(self.question)
+            await self._fetch_website_text(search, session, throttle, search_limit, out_dir)
             
-            # Async file cleanup
-            data_file = f"data/{search}.md"
-            if os.path.exists(data_file):
-                os.remove(data_file)
+            # Ingest just this search's scrape into the shared KG, then query;
+            # the semaphore in _run_all already bounds queries in flight
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self._ingest_dir, out_dir)
+            response = await self.knowledge_g.aquery(self._question_for(idx), self.executor)
             
-            with open(cache_file, 'wb') as f:
-                pickle.dump(response, f)
+            self.cache.set(cache_key, response)
             
             return response
             
         except Exception as e:
             return f"Error processing {search}: {str(e)}"
+        
+        finally:
+            # Remove the scratch folder even when the search failed part-way
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    async def _run_all(self, answers: List[Optional[str]], checkpoint: CheckpointLog, pbar: tqdm) -> None:
+        """
+        Run every search on one event loop with one shared HTTP session.
 
-    async def _process_batch_async(self, searches: List[str]) -> List[str]:
-        """Process a batch of searches asynchronously"""
-        async with aiohttp.ClientSession() as session:
-            tasks = [self._process_single_search_async(search, session) for search in searches]
-            return await asyncio.gather(*tasks)
+        Keeping a single session for the whole job lets connections (and
+        their TLS sessions) be reused. All searches are scheduled at once
+        and the semaphore bounds how many are in flight, so a slow search
+        never holds back the ones behind it. Results are handled in
+        completion order: each one is stored at its index in answers and
+        appended to the checkpoint, which flushes every batch_size records.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        throttle = HostThrottle(self.max_per_host_inflight, self.per_host_delay_ms)
+        # Per run: the limiter is bound to this event loop
+        search_limit = create_search_limiter()
+        
+        async with create_session(limit=100, keepalive_timeout=60) as session:
+            async def bounded(idx: int) -> Tuple[int, str]:
+                async with semaphore:
+                    return idx, await self._process_single_search_async(idx, session, throttle, search_limit)
+            
+            for next_result in asyncio.as_completed([bounded(idx) for idx in range(len(self.searches))]):
+                idx, answer = await next_result
+                answers[idx] = answer
+                checkpoint.write(
+                    (json.dumps({'search': self.searches[idx], 'answer': answer}) + '\n').encode()
+                )
+                pbar.update(1)
 
     def __call__(self) -> None:
         """Execute the processing pipeline with async batching"""
         logging.info("Starting batch processing")
         
         try:
-            answers = []
-            loop = asyncio.get_event_loop()
+            answers = [None] * len(self.searches)
             
-            with tqdm(total=len(self.searches)) as pbar:
-                for i in range(0, len(self.searches), self.batch_size):
-                    batch = self.searches[i:i + self.batch_size]
-                    batch_answers = loop.run_until_complete(self._process_batch_async(batch))
-                    answers.extend(batch_answers)
-                    pbar.update(len(batch))
-                    
-                    # Save intermediate results less frequently
-                    if i % (self.batch_size * 5) == 0:
-                        self.csv['answers'] = answers + [''] * (len(self.searches) - len(answers))
-                        self.csv.to_csv('intermediate_results.csv', index=False)
+            # Append-only checkpoint: one JSON line per finished search
+            with CheckpointLog(INTERMEDIATE_FILE, self.batch_size) as checkpoint, \
+                    tqdm(total=len(self.searches)) as pbar:
+                asyncio.run(self._run_all(answers, checkpoint, pbar))
             
-            self.csv['answers'] = answers
+            # Broadcast answers for unique searches back to every row
+            self.csv['answers'] = [answers[idx] for idx in self.search_index]
+            self._results = None
             
         except Exception as e:
             logging.error(f"Batch processing failed: {str(e)}")
@@ -159,23 +402,49 @@ class AllInOne:
         """
         Get the results as a pandas DataFrame.
 
+        The full input CSV is read on the first call after processing and
+        the frame is reused by later calls (e.g. save_results followed by
+        display), so it should be treated as read-only.
+
         Returns:
-            pd.DataFrame: DataFrame containing the results
+            pd.DataFrame: DataFrame containing all input columns and the answers
         """
-        return self.csv
+        if self._results is not None:
+            return self._results
+        results = pd.read_csv(self.csv_path, **CSV_READ_OPTIONS)
+        if 'answers' in self.csv:
+            results['answers'] = self.csv['answers'].to_numpy()
+            self._results = results
+        return results
 
     def save_results(self, output_path: str) -> None:
         """
-        Save results to CSV file.
+        Save results to a CSV file, or to Parquet if output_path ends with ".parquet".
+
+        Both are written by pyarrow's C++ writers rather than pandas; a CSV
+        whose columns pyarrow cannot convert falls back to pandas' writer.
 
         Args:
-            output_path (str): Path where to save the CSV file
+            output_path (str): Path where to save the results
 
         Raises:
             Exception: If saving fails
         """
         try:
-            self.csv.to_csv(output_path, index=False)
+            results = self.get_results_as_dataframe()
+            if output_path.endswith(".parquet"):
+                table = pa.Table.from_pandas(results, preserve_index=False)
+                pq.write_table(table, output_path, compression='zstd')
+            else:
+                try:
+                    table = pa.Table.from_pandas(results, preserve_index=False)
+                except pa.ArrowInvalid:
+                    results.to_csv(output_path, index=False)
+                else:
+                    pa_csv.write_csv(
+                        table, output_path,
+                        write_options=pa_csv.WriteOptions(batch_size=16384)
+                    )
             logging.info(f"Results saved to {output_path}")
         except Exception as e:
             logging.error(f"Failed to save results: {str(e)}")